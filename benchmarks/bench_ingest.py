@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for the consumer ingest decode path.
+
+Compares the previous decode path (text decode + json.loads + per-call
+dictionary of required fields) with the current one (raw bytes decoded by
+cybercare.consumer.decode_json + validate_event) and reports per-event
+CPU time for single events and batches.
+
+Usage (from the repository root):
+    make bench
+    python -m benchmarks.bench_ingest [--repeat N] [--batch-size N]
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from cybercare.consumer import decode_json, orjson, validate_events
+
+
+def legacy_validate_event(event: Dict[str, Any]) -> bool:
+    """Validate an event the way the consumer did before the fast path."""
+    required_fields = {"event_type": str, "event_payload": str}
+
+    if not isinstance(event, dict):
+        return False
+
+    for field, expected_type in required_fields.items():
+        if field not in event or not isinstance(event[field], expected_type):
+            return False
+
+    return True
+
+
+def legacy_ingest(body: bytes) -> Any:
+    """Decode and validate a body with the previous stdlib-only path."""
+    document = json.loads(body.decode("utf-8"))
+    if isinstance(document, list):
+        return all(legacy_validate_event(event) for event in document)
+    return legacy_validate_event(document)
+
+
+def fast_ingest(body: bytes) -> Any:
+    """Decode and validate a body with the current consumer path."""
+    return validate_events(decode_json(body), max_batch_size=sys.maxsize)
+
+
+def per_event_us(
+    func: Callable[[bytes], Any], body: bytes, events: int, repeat: int
+) -> float:
+    """Return the best-of-five CPU time per event in microseconds."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.process_time()
+        for _ in range(repeat):
+            func(body)
+        best = min(best, time.process_time() - start)
+    return best / (repeat * events) * 1e6
+
+
+def main() -> None:
+    """Run the benchmark and print a comparison table."""
+    parser = argparse.ArgumentParser(description="Consumer ingest micro-benchmark")
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with open("events.json", "r", encoding="utf-8") as f:
+        samples: List[Dict[str, Any]] = json.load(f)
+
+    single = json.dumps(samples[0]).encode("utf-8")
+    batch = json.dumps(
+        [samples[i % len(samples)] for i in range(args.batch_size)]
+    ).encode("utf-8")
+    batch_repeat = max(1, args.repeat // args.batch_size)
+
+    print(f"decoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'case':<10}{'legacy us/event':>18}{'fast us/event':>16}{'speedup':>10}")
+    for name, body, events, repeat in (
+        ("single", single, 1, args.repeat),
+        ("batch", batch, args.batch_size, batch_repeat),
+    ):
+        legacy = per_event_us(legacy_ingest, body, events, repeat)
+        fast = per_event_us(fast_ingest, body, events, repeat)
+        print(f"{name:<10}{legacy:>18.3f}{fast:>16.3f}{legacy / fast:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,28 +5,62 @@ This module provides functionality to receive and store security events
 via an HTTP API, storing them in a PostgreSQL database.
 """
 
+import hmac
+import ipaddress
 import json
 import logging
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import psycopg2
 import psycopg2.extensions
+import psycopg2.extras
 import uvicorn
 from fastapi import Depends, FastAPI, HTTPException, Request
-from psycopg2 import sql
+from fastapi.responses import PlainTextResponse
+from psycopg2 import errorcodes, sql
 
+from cybercare import profiling
 from cybercare.utils import setup_basic_app
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None  # type: ignore[assignment]
+
 app = FastAPI()
+app.add_middleware(profiling.StageTimingMiddleware)
+
+# Default ingest limits, overridable through the consumer "ingest" config section
+DEFAULT_MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_MAX_BATCH_SIZE = 1000
+
+# Upper bound for a single on-demand sampling profile, in seconds
+DEFAULT_MAX_PROFILE_SECONDS = 30
+
+# Only one sampling profile may run at a time
+_profile_lock = threading.Lock()
 
+# Required event fields and their expected types
+EVENT_FIELDS: Tuple[Tuple[str, type], ...] = (
+    ("event_type", str),
+    ("event_payload", str),
+)
 
-# pylint: disable=too-few-public-methods
-class PostgresEventStorage:
+# Length of the event_types.name column
+MAX_EVENT_TYPE_LENGTH = 255
+
+
+class PostgresEventStorage:  # pylint: disable=too-many-instance-attributes
     """PostgreSQL implementation of event storage.
 
     This class provides functionality to store event data in a PostgreSQL database.
     It handles connection management and data persistence operations.
 
+    Event type names are stored once in a lookup table and referenced by id
+    from the events table. Known ids are cached in-process, so storing an
+    event of an already seen type needs no extra round trip.
+
     Attributes:
         host (str): Database server hostname
         port (int): Database server port
@@ -34,6 +68,7 @@ class PostgresEventStorage:
         user (str): Database username
         password (str): Database password
         table_name (str): Name of the table to store events
+        event_types_table (str): Name of the event type lookup table
     """
 
     def __init__(self, config: Dict[str, Any]):
@@ -43,6 +78,8 @@ class PostgresEventStorage:
         self.user = config.get("user", "postgres")
         self.password = config.get("password", "postgres")
         self.table_name = config.get("table_name", "events")
+        self.event_types_table = config.get("event_types_table", "event_types")
+        self._type_ids: Dict[str, int] = {}
         logging.info(
             "PostgreSQL storage configured for %s:%s/%s",
             self.host,
@@ -64,6 +101,81 @@ class PostgresEventStorage:
             password=self.password,
         )
 
+    def _fetch_type_ids(
+        self, cursor: psycopg2.extensions.cursor, names: Iterable[str]
+    ) -> Dict[str, int]:
+        """Resolve event type names that are not cached yet.
+
+        Existing names are looked up first, so only genuinely new names are
+        inserted and draw values from the id sequence. Names inserted
+        concurrently by another writer are looked up again.
+
+        Args:
+            cursor (psycopg2.extensions.cursor): Cursor of the storing transaction
+            names (Iterable[str]): Event type names used by the events being stored
+
+        Returns:
+            Dict[str, int]: Ids of the names that were missing from the cache
+        """
+        missing = sorted(set(names).difference(self._type_ids))
+        if not missing:
+            return {}
+
+        select = sql.SQL("SELECT name, id FROM {} WHERE name = ANY(%s)").format(
+            sql.Identifier(self.event_types_table)
+        )
+        cursor.execute(select, (missing,))
+        fetched = dict(cursor.fetchall())
+
+        new_names = [name for name in missing if name not in fetched]
+        if new_names:
+            cursor.execute(
+                sql.SQL(
+                    "INSERT INTO {} (name) SELECT unnest(%s::text[]) "
+                    "ON CONFLICT (name) DO NOTHING RETURNING name, id"
+                ).format(sql.Identifier(self.event_types_table)),
+                (new_names,),
+            )
+            fetched.update(cursor.fetchall())
+
+            raced = [name for name in new_names if name not in fetched]
+            if raced:
+                cursor.execute(select, (raced,))
+                fetched.update(cursor.fetchall())
+
+        return fetched
+
+    def _insert_events(self, events: List[Dict[str, Any]]) -> None:
+        """Insert events in a single transaction, resolving their type ids.
+
+        Args:
+            events (List[Dict[str, Any]]): The events to store
+
+        Raises:
+            psycopg2.Error: If the transaction fails
+        """
+        with self._get_connection() as conn:
+            with conn.cursor() as cursor:
+                fetched = self._fetch_type_ids(
+                    cursor, (event.get("event_type", "") for event in events)
+                )
+                type_ids = {**self._type_ids, **fetched} if fetched else self._type_ids
+                psycopg2.extras.execute_values(
+                    cursor,
+                    sql.SQL(
+                        "INSERT INTO {} (event_type_id, event_payload) VALUES %s"
+                    ).format(sql.Identifier(self.table_name)),
+                    [
+                        (
+                            type_ids[event.get("event_type", "")],
+                            event.get("event_payload", ""),
+                        )
+                        for event in events
+                    ],
+                )
+        # Only cache ids once the transaction that may have created them is committed
+        self._type_ids.update(fetched)
+
     def store_event(self, event: Dict[str, Any]) -> bool:
         """Store an event in the PostgreSQL database.
 
@@ -73,32 +185,70 @@ class PostgresEventStorage:
         Returns:
             bool: True if the event was stored successfully, False otherwise
         """
+        return self.store_events([event])
+
+    def store_events(self, events: List[Dict[str, Any]]) -> bool:
+        """Store a batch of events in a single transaction.
+
+        If a cached type id turns out to be stale, the cache is cleared and
+        the batch is retried once.
+
+        Args:
+            events (List[Dict[str, Any]]): The events to store
+
+        Returns:
+            bool: True if all events were stored successfully, False otherwise
+        """
         try:
-            with self._get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        sql.SQL(
-                            "INSERT INTO {} (event_type, event_payload) VALUES (%s, %s)"
-                        ).format(sql.Identifier(self.table_name)),
-                        (event.get("event_type", ""), event.get("event_payload", "")),
-                    )
-                return True
+            try:
+                self._insert_events(events)
+            except psycopg2.IntegrityError as e:
+                if e.pgcode != errorcodes.FOREIGN_KEY_VIOLATION:
+                    raise
+                logging.warning("Stale event type id, clearing type cache: %s", e)
+                self._type_ids.clear()
+                self._insert_events(events)
+            return True
         except psycopg2.OperationalError as e:
             logging.error("Database connection error: %s", e)
             return False
         except psycopg2.DatabaseError as e:
-            logging.error("Database error when storing event: %s", e)
+            logging.error("Database error when storing events: %s", e)
             return False
         except Exception as e:  # pylint: disable=broad-exception-caught
-            logging.error("Unexpected error storing event: %s", e)
+            logging.error("Unexpected error storing events: %s", e)
             return False
 
 
+def decode_json(body: bytes) -> Any:
+    """Decode a raw JSON request body.
+
+    Uses orjson when it is installed and falls back to the standard library
+    json module otherwise.
+
+    Args:
+        body (bytes): The raw request body
+
+    Returns:
+        Any: The decoded JSON document
+
+    Raises:
+        ValueError: If the body is not valid JSON (json.JSONDecodeError and
+                    orjson.JSONDecodeError are both ValueError subclasses)
+    """
+    if orjson is not None:
+        return orjson.loads(body)  # pylint: disable=no-member
+    return json.loads(body)
+
+
 def validate_event(event: Dict[str, Any]) -> bool:
     """Validate that an event conforms to the required format.
 
     This function checks if the provided event is a dictionary with 'event_type'
-    and 'event_payload' keys, both containing string values.
+    and 'event_payload' keys, both containing string values, and that the
+    event type fits the event_types.name column. The field
+    specification is the module-level EVENT_FIELDS tuple, so no per-call
+    structures are built.
 
     Args:
         event (Dict[str, Any]): The event to validate
@@ -106,16 +256,74 @@ def validate_event(event: Dict[str, Any]) -> bool:
     Returns:
         bool: True if the event is valid, False otherwise
     """
-    required_fields = {"event_type": str, "event_payload": str}
-
     if not isinstance(event, dict):
         return False
 
-    for field, expected_type in required_fields.items():
-        if field not in event or not isinstance(event[field], expected_type):
+    get = event.get
+    for field, expected_type in EVENT_FIELDS:
+        if not isinstance(get(field), expected_type):
             return False
 
-    return True
+    return len(event["event_type"]) <= MAX_EVENT_TYPE_LENGTH
+
+
+def validate_events(
+    document: Any, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
+    """Validate a decoded request body holding one event or a batch of events.
+
+    Args:
+        document (Any): The decoded JSON document
+        max_batch_size (int): Maximum number of events accepted in one batch
+
+    Returns:
+        Union[Dict[str, Any], List[Dict[str, Any]], None]: The validated event or
+            list of events, or None if the document is not acceptable
+    """
+    if isinstance(document, list):
+        if not document or len(document) > max_batch_size:
+            return None
+        for event in document:
+            if not validate_event(event):
+                return None
+        return document
+    if validate_event(document):
+        return document
+    return None
+
+
+async def read_body(request: Request, max_body_bytes: int) -> bytes:
+    """Read the raw request body, enforcing a size limit before parsing.
+
+    The declared Content-Length is checked first, and the streamed body is
+    checked as it arrives so oversized chunked uploads are cut off early.
+
+    Args:
+        request (Request): The FastAPI request object
+        max_body_bytes (int): Maximum accepted body size in bytes
+
+    Returns:
+        bytes: The raw request body
+
+    Raises:
+        HTTPException: 413 if the body exceeds the limit
+                      400 if the Content-Length header is malformed
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            declared = int(content_length)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length") from e
+        if declared > max_body_bytes:
+            raise HTTPException(status_code=413, detail="Request body too large")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_body_bytes:
+            raise HTTPException(status_code=413, detail="Request body too large")
+    return bytes(body)
 
 
 def get_storage() -> PostgresEventStorage:
@@ -136,35 +344,168 @@ async def receive_event(
 ) -> Dict[str, str]:
     """Handle incoming event POST requests.
 
-    This endpoint receives events in JSON format, validates them,
-    and stores them in the configured storage.
+    This endpoint receives a single event or a JSON array of events,
+    validates them, and stores them in the configured storage.
 
     Args:
         request (Request): The FastAPI request object
         storage (PostgresEventStorage): The event storage dependency
 
     Returns:
-        dict: A success response if the event is stored
+        dict: A success response if the event(s) are stored
 
     Raises:
         HTTPException: 400 if the event format is invalid or not JSON
+                      413 if the request body is too large
                       500 if storage fails
     """
+    timer = getattr(request.state, profiling.STAGE_TIMER_KEY, profiling.NULL_TIMER)
+    max_body_bytes = getattr(
+        request.app.state, "max_body_bytes", DEFAULT_MAX_BODY_BYTES
+    )
+    max_batch_size = getattr(
+        request.app.state, "max_batch_size", DEFAULT_MAX_BATCH_SIZE
+    )
+
+    with timer.stage("read"):
+        body = await read_body(request, max_body_bytes)
     try:
-        event = await request.json()
-        logging.info("Received event: %s", event)
-
-        if not validate_event(event):
-            logging.warning("Invalid event format: %s", event)
-            raise HTTPException(status_code=400, detail="Invalid event format")
-
-        if storage.store_event(event):
-            return {"status": "success", "message": "Event stored successfully"}
-        raise HTTPException(status_code=500, detail="Failed to store event")
-    except json.JSONDecodeError as e:
+        with timer.stage("decode"):
+            document = decode_json(body)
+    except ValueError as e:
         logging.warning("Failed to decode JSON: %s", e)
         raise HTTPException(status_code=400, detail="Invalid JSON") from e
 
+    with timer.stage("validate"):
+        events = validate_events(document, max_batch_size)
+    if events is None:
+        logging.warning("Invalid event format (%d bytes)", len(body))
+        raise HTTPException(status_code=400, detail="Invalid event format")
+
+    if isinstance(events, list):
+        logging.debug("Received batch of %d events", len(events))
+        with timer.stage("store"):
+            stored = storage.store_events(events)
+        if stored:
+            return {
+                "status": "success",
+                "message": f"{len(events)} events stored successfully",
+            }
+        raise HTTPException(status_code=500, detail="Failed to store events")
+
+    logging.debug("Received event of type %s", events["event_type"])
+    with timer.stage("store"):
+        stored = storage.store_event(events)
+    if stored:
+        return {"status": "success", "message": "Event stored successfully"}
+    raise HTTPException(status_code=500, detail="Failed to store event")
+
+
+def is_loopback(host: Optional[str]) -> bool:
+    """Check whether a client address is a loopback address.
+
+    Args:
+        host (Optional[str]): The client host as reported by the server
+
+    Returns:
+        bool: True for loopback IP addresses, False otherwise
+    """
+    if not host:
+        return False
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_admin(request: Request) -> None:
+    """Dependency that restricts access to the admin endpoints.
+
+    Admin endpoints are hidden unless enabled. When enabled, they are served
+    to loopback clients, or to any client presenting the configured admin
+    token as "Authorization: Bearer <token>".
+
+    Args:
+        request (Request): The FastAPI request object
+
+    Raises:
+        HTTPException: 404 if admin endpoints are disabled
+                      403 if the client is neither local nor authorized
+    """
+    state = request.app.state
+    if not getattr(state, "admin_endpoints", False):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    admin_token = getattr(state, "admin_token", None)
+    if admin_token:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(
+            token.encode("utf-8"), admin_token.encode("utf-8")
+        ):
+            return
+
+    if not is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+admin_dependency = Depends(require_admin)
+
+
+@app.get("/admin/stage-metrics", dependencies=[admin_dependency])
+def stage_metrics(request: Request) -> Dict[str, Dict[str, float]]:
+    """Return per-stage request timing aggregated since startup.
+
+    Args:
+        request (Request): The FastAPI request object
+
+    Returns:
+        dict: count, total_ms, avg_ms and max_ms for each stage
+    """
+    metrics = getattr(request.app.state, "stage_metrics", None)
+    if metrics is None:
+        return {}
+    return metrics.snapshot()
+
+
+@app.get(
+    "/admin/profile",
+    dependencies=[admin_dependency],
+    response_class=PlainTextResponse,
+)
+def profile(request: Request, seconds: float = 5.0, interval_ms: float = 10.0) -> str:
+    """Run a time-boxed sampling profile of the live process.
+
+    The endpoint is synchronous so it runs in the worker thread pool while
+    the event loop keeps serving (and being sampled).
+
+    Args:
+        request (Request): The FastAPI request object
+        seconds (float): Sampling duration in seconds (default: 5)
+        interval_ms (float): Delay between samples in milliseconds (default: 10)
+
+    Returns:
+        str: Collapsed stacks, one "frame;frame;... count" line per stack,
+             suitable for flamegraph.pl or speedscope
+
+    Raises:
+        HTTPException: 400 if the duration or interval is out of range
+                      409 if another profile is already running
+    """
+    max_seconds = getattr(
+        request.app.state, "max_profile_seconds", DEFAULT_MAX_PROFILE_SECONDS
+    )
+    if not 0 < seconds <= max_seconds or not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="Invalid profile parameters")
+
+    if not _profile_lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+        raise HTTPException(status_code=409, detail="Profile already running")
+    try:
+        logging.info("Sampling profile started for %.1f seconds", seconds)
+        counts = profiling.sample_stacks(seconds, interval_ms / 1000)
+    finally:
+        _profile_lock.release()
+    return profiling.collapse_stacks(counts)
+
 
 def main() -> None:
     """Run the event consumer service.
@@ -185,6 +526,29 @@ def main() -> None:
     host = server_config.get("host", "0.0.0.0")
     port = server_config.get("port", 8000)
 
+    ingest_config = consumer_config.get("ingest", {})
+    app.state.max_body_bytes = ingest_config.get(
+        "max_body_bytes", DEFAULT_MAX_BODY_BYTES
+    )
+    app.state.max_batch_size = ingest_config.get(
+        "max_batch_size", DEFAULT_MAX_BATCH_SIZE
+    )
+    profiling_config = consumer_config.get("profiling", {})
+    app.state.stage_timing = profiling_config.get("stage_timing", False)
+    app.state.stage_metrics = profiling.StageMetrics()
+    app.state.admin_endpoints = profiling_config.get("admin_endpoints", False)
+    app.state.admin_token = profiling_config.get("admin_token")
+    if app.state.admin_token and app.state.admin_token.startswith("${"):
+        logging.error("Admin token environment variable is not set; ignoring it")
+        app.state.admin_token = None
+    app.state.max_profile_seconds = profiling_config.get(
+        "max_profile_seconds", DEFAULT_MAX_PROFILE_SECONDS
+    )
+
+    logging.info(
+        "JSON decoder: %s", "orjson" if orjson is not None else "json (stdlib)"
+    )
+
     app.state.storage = PostgresEventStorage(db_config)
     logging.info("Starting Event Consumer service on %s:%s", host, port)
     uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,231 @@
+"""
+Profiling helpers for the Cybercare package.
+
+This module provides per-request stage timing, exported as a Server-Timing
+header and aggregated into in-process metrics, and a stdlib-based sampling
+profiler that produces flamegraph-compatible collapsed stacks.
+"""
+
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, MutableMapping
+
+# ASGI type aliases
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# Key under which the per-request timer is stored in request.state
+STAGE_TIMER_KEY = "stage_timer"
+
+
+class StageTimer:
+    """Collects wall-clock durations of named stages within one request.
+
+    Attributes:
+        stages (Dict[str, float]): Accumulated duration of each stage in seconds
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block and add it to the named stage.
+
+        Args:
+            name (str): Name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        """Return the seconds elapsed since the timer was created."""
+        return time.perf_counter() - self._start
+
+    def server_timing(self, total: float) -> str:
+        """Format the recorded stages as a Server-Timing header value.
+
+        Args:
+            total (float): Total request duration in seconds
+
+        Returns:
+            str: Header value with durations in milliseconds
+        """
+        entries = [
+            f"{name};dur={duration * 1000:.3f}"
+            for name, duration in self.stages.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+class NullStageTimer:  # pylint: disable=too-few-public-methods
+    """Stage timer used when profiling is disabled; records nothing."""
+
+    # pylint: disable=unused-argument
+    def stage(self, name: str) -> contextlib.AbstractContextManager:
+        """Return a no-op context manager."""
+        return contextlib.nullcontext()
+
+
+NULL_TIMER = NullStageTimer()
+
+
+class StageMetrics:
+    """Thread-safe aggregate of stage durations across requests.
+
+    For each stage the request count, total and maximum duration are kept.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, float] = {}
+        self._maxima: Dict[str, float] = {}
+
+    def record(self, stages: Dict[str, float]) -> None:
+        """Add the durations of one request.
+
+        Args:
+            stages (Dict[str, float]): Stage durations in seconds
+        """
+        with self._lock:
+            for name, duration in stages.items():
+                self._counts[name] = self._counts.get(name, 0) + 1
+                self._totals[name] = self._totals.get(name, 0.0) + duration
+                self._maxima[name] = max(self._maxima.get(name, 0.0), duration)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return the aggregated metrics with durations in milliseconds.
+
+        Returns:
+            Dict[str, Dict[str, float]]: count, total_ms, avg_ms and max_ms per stage
+        """
+        with self._lock:
+            return {
+                name: {
+                    "count": count,
+                    "total_ms": self._totals[name] * 1000,
+                    "avg_ms": self._totals[name] * 1000 / count,
+                    "max_ms": self._maxima[name] * 1000,
+                }
+                for name, count in self._counts.items()
+            }
+
+    def reset(self) -> None:
+        """Discard all recorded metrics."""
+        with self._lock:
+            self._counts.clear()
+            self._totals.clear()
+            self._maxima.clear()
+
+
+class StageTimingMiddleware:  # pylint: disable=too-few-public-methods
+    """ASGI middleware that adds opt-in per-request stage timing.
+
+    Timing is enabled by setting ``app.state.stage_timing`` to True. When
+    enabled, a StageTimer is placed in ``request.state.stage_timer`` for the
+    endpoint to fill in, and the recorded stages plus the total time spent in
+    the application are returned in a Server-Timing header. Requests whose
+    endpoint recorded at least one stage are also added to
+    ``app.state.stage_metrics``, so admin calls and unknown routes do not skew
+    the aggregate. When disabled, requests pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        state = scope["app"].state if "app" in scope else None
+        if scope["type"] != "http" or not getattr(state, "stage_timing", False):
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        scope.setdefault("state", {})[STAGE_TIMER_KEY] = timer
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total = timer.elapsed()
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", timer.server_timing(total).encode("latin-1"))
+                )
+                message["headers"] = headers
+                metrics = getattr(state, "stage_metrics", None)
+                if metrics is not None and timer.stages:
+                    metrics.record({**timer.stages, "total": total})
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+def _frame_stack(frame: Any) -> str:
+    """Render a frame and its callers as a root-first collapsed stack."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def sample_stacks(duration: float, interval: float = 0.01) -> Dict[str, int]:
+    """Sample the stacks of all other threads for a fixed period.
+
+    Uses sys._current_frames(), so it needs no external profiler and can be
+    run against the live process from any thread.
+
+    Args:
+        duration (float): How long to sample, in seconds
+        interval (float): Delay between samples, in seconds (default: 0.01)
+
+    Returns:
+        Dict[str, int]: Number of samples per collapsed stack; each key is the
+                        thread name followed by the root-first frames, separated by ';'
+    """
+    own_id = threading.get_ident()
+    counts: Dict[str, int] = collections.Counter()
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            thread_name = thread_names.get(thread_id, str(thread_id))
+            counts[f"{thread_name};{_frame_stack(frame)}"] += 1
+        time.sleep(interval)
+
+    return dict(counts)
+
+
+def collapse_stacks(counts: Dict[str, int]) -> str:
+    """Format sampled stacks in the collapsed format used by flamegraph tools.
+
+    Args:
+        counts (Dict[str, int]): Number of samples per collapsed stack
+
+    Returns:
+        str: One "stack count" line per distinct stack, most frequent first
+    """
+    lines = [
+        f"{stack} {count}"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+    return "\n".join(lines) + "\n" if lines else ""
@@ -23,11 +23,12 @@ echo "Reading database configuration from $CONFIG_FILE..."
 
 # Manual extraction for database configuration
 # This avoids complex YAML parsing
-DB_HOST=$(grep -A10 "^database:" "$CONFIG_FILE" | grep "host:" | head -1 | cut -d: -f2 | tr -d ' ')
-DB_PORT=$(grep -A10 "^database:" "$CONFIG_FILE" | grep "port:" | head -1 | cut -d: -f2 | tr -d ' ')
-DB_NAME=$(grep -A10 "^database:" "$CONFIG_FILE" | grep "name:" | head -1 | cut -d: -f2 | tr -d ' ')
-DB_USER=$(grep -A10 "^database:" "$CONFIG_FILE" | grep "user:" | head -1 | cut -d: -f2 | tr -d ' ')
-DB_TABLE_NAME=$(grep -A10 "^database:" "$CONFIG_FILE" | grep "table_name:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_HOST=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "host:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_PORT=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "port:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_NAME=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "name:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_USER=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "user:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_TABLE_NAME=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "table_name:" | head -1 | cut -d: -f2 | tr -d ' ')
+DB_EVENT_TYPES_TABLE=$(grep -A15 "^database:" "$CONFIG_FILE" | grep "event_types_table:" | head -1 | cut -d: -f2 | tr -d ' ')
 
 # Verify required parameters are present
 if [ -z "$DB_HOST" ] || [ -z "$DB_PORT" ] || [ -z "$DB_NAME" ] || [ -z "$DB_USER" ]; then
@@ -48,12 +49,19 @@ if [ -z "$DB_TABLE_NAME" ]; then
     echo "No table name specified, using default: $DB_TABLE_NAME"
 fi
 
+# Set default event types table name if not specified
+if [ -z "$DB_EVENT_TYPES_TABLE" ]; then
+    DB_EVENT_TYPES_TABLE="event_types"
+    echo "No event types table name specified, using default: $DB_EVENT_TYPES_TABLE"
+fi
+
 echo "Database configuration:"
 echo "  Host: $DB_HOST"
 echo "  Port: $DB_PORT"
 echo "  Name: $DB_NAME"
 echo "  User: $DB_USER"
 echo "  Table: $DB_TABLE_NAME"
+echo "  Event types table: $DB_EVENT_TYPES_TABLE"
 
 echo "Connecting to PostgreSQL at ${DB_HOST}:${DB_PORT}..."
 
@@ -66,14 +74,60 @@ fi
 echo "Creating database $DB_NAME if it doesn't exist..."
 PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -tc "SELECT 1 FROM pg_database WHERE datname = '$DB_NAME'" postgres | grep -q 1 || PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -c "CREATE DATABASE $DB_NAME" postgres
 
+echo "Creating event types table ($DB_EVENT_TYPES_TABLE)..."
+PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "
+CREATE TABLE IF NOT EXISTS $DB_EVENT_TYPES_TABLE (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE
+);
+"
+
 echo "Creating events table ($DB_TABLE_NAME)..."
 PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "
 CREATE TABLE IF NOT EXISTS $DB_TABLE_NAME (
     id SERIAL PRIMARY KEY,
-    event_type VARCHAR(255) NOT NULL,
+    event_type_id INTEGER NOT NULL REFERENCES $DB_EVENT_TYPES_TABLE (id),
     event_payload TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 "
 
+# Tables created by earlier versions of this script store the type name inline
+echo "Migrating inline event types in $DB_TABLE_NAME (if any)..."
+PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -v ON_ERROR_STOP=1 -c "
+DO \$\$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = '$DB_TABLE_NAME'
+          AND column_name = 'event_type'
+    ) THEN
+        INSERT INTO $DB_EVENT_TYPES_TABLE (name)
+            SELECT DISTINCT event_type FROM $DB_TABLE_NAME
+            ON CONFLICT (name) DO NOTHING;
+        ALTER TABLE $DB_TABLE_NAME
+            ADD COLUMN IF NOT EXISTS event_type_id INTEGER REFERENCES $DB_EVENT_TYPES_TABLE (id);
+        UPDATE $DB_TABLE_NAME e SET event_type_id = t.id
+            FROM $DB_EVENT_TYPES_TABLE t WHERE t.name = e.event_type;
+        ALTER TABLE $DB_TABLE_NAME ALTER COLUMN event_type_id SET NOT NULL;
+        ALTER TABLE $DB_TABLE_NAME DROP COLUMN event_type;
+    END IF;
+END
+\$\$;
+"
+if [ $? -ne 0 ]; then
+    echo "Error: Failed to migrate $DB_TABLE_NAME to the $DB_EVENT_TYPES_TABLE lookup table"
+    exit 1
+fi
+
+# Queries and exports can use this view to get event type names back
+echo "Creating events view (${DB_TABLE_NAME}_with_types)..."
+PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "
+CREATE OR REPLACE VIEW ${DB_TABLE_NAME}_with_types AS
+SELECT e.id, t.name AS event_type, e.event_payload, e.created_at
+FROM $DB_TABLE_NAME e
+JOIN $DB_EVENT_TYPES_TABLE t ON t.id = e.event_type_id;
+"
+
 echo "Database initialization completed successfully."
@@ -22,6 +22,9 @@ setup(
         "httpx",
     ],
     extras_require={
+        "fast": [
+            "orjson",
+        ],
         "dev": [
             "types-PyYAML",
             "types-requests",
@@ -31,7 +34,7 @@ setup(
             "pytest-asyncio",
             "black",
             "pylint",
-        ]
+        ],
     },
     entry_points={
         "console_scripts": [
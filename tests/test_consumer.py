@@ -1,11 +1,17 @@
-from unittest.mock import MagicMock
+import json
+from unittest.mock import MagicMock, patch
 
+import psycopg2
 import pytest
 from fastapi.testclient import TestClient
+from psycopg2 import errorcodes
 
-from cybercare.consumer import app, get_storage, validate_event
+from cybercare import consumer
+from cybercare.consumer import app, decode_json, get_storage, validate_event
+from cybercare.profiling import StageMetrics
 
 client = TestClient(app)
+local_client = TestClient(app, client=("127.0.0.1", 50000))
 
 
 @pytest.mark.parametrize(
@@ -29,6 +35,9 @@ client = TestClient(app)
         ({"event_type": "", "event_payload": ""}, True),  # Empty strings are valid
         ({"event_type": "message", "event_payload": "a" * 1000}, True),  # Large payload
         ({"event_type": "alert", "event_payload": "特殊文字"}, True),  # Unicode
+        # Event type must fit the event_types.name column
+        ({"event_type": "a" * 255, "event_payload": "test"}, True),
+        ({"event_type": "a" * 256, "event_payload": "test"}, False),
     ],
 )
 def test_validate_event(event, expected):
@@ -112,3 +121,326 @@ def test_receive_event_success(successful_storage):
 
     # Verify the mock was called with the correct event
     successful_storage.store_event.assert_called_once()
+
+
+def test_receive_event_batch_success(successful_storage):
+    """Test receiving and storing a batch of events."""
+    successful_storage.store_events.return_value = True
+    events = [
+        {"event_type": "message", "event_payload": "hello"},
+        {"event_type": "user_joined", "event_payload": "Peter"},
+    ]
+    response = client.post("/event", json=events)
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "success",
+        "message": "2 events stored successfully",
+    }
+
+    successful_storage.store_events.assert_called_once_with(events)
+    successful_storage.store_event.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        # Empty batch
+        [],
+        # One invalid event rejects the whole batch
+        [{"event_type": "message", "event_payload": "ok"}, {"event_type": 1}],
+        # Nested batches are not accepted
+        [[{"event_type": "message", "event_payload": "ok"}]],
+    ],
+)
+def test_receive_event_batch_invalid(content, mock_storage):
+    """Test that malformed batches are rejected before storage."""
+    response = client.post("/event", json=content)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid event format"}
+    mock_storage.store_events.assert_not_called()
+
+
+def test_receive_event_batch_too_large(mock_storage):
+    """Test that batches above the configured size are rejected."""
+    app.state.max_batch_size = 2
+    try:
+        response = client.post(
+            "/event",
+            json=[{"event_type": "message", "event_payload": "x"}] * 3,
+        )
+    finally:
+        del app.state.max_batch_size
+    assert response.status_code == 400
+    mock_storage.store_events.assert_not_called()
+
+
+def test_receive_event_body_too_large(mock_storage):
+    """Test that oversized bodies are rejected before parsing."""
+    app.state.max_body_bytes = 64
+    try:
+        response = client.post(
+            "/event", json={"event_type": "message", "event_payload": "a" * 100}
+        )
+    finally:
+        del app.state.max_body_bytes
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body too large"}
+    mock_storage.store_event.assert_not_called()
+
+
+def test_decode_json_matches_stdlib():
+    """Test that the fast decoder agrees with the standard library."""
+    body = '{"event_type": "alert", "event_payload": "特殊文字"}'.encode("utf-8")
+    assert decode_json(body) == json.loads(body)
+    with pytest.raises(ValueError):
+        decode_json(b"invalid json")
+
+
+@pytest.fixture
+def stage_timing():
+    """Fixture to enable stage timing with fresh metrics."""
+    app.state.stage_timing = True
+    app.state.stage_metrics = StageMetrics()
+    yield app.state.stage_metrics
+    del app.state.stage_timing
+    del app.state.stage_metrics
+
+
+@pytest.fixture
+def admin_endpoints():
+    """Fixture to enable the admin endpoints."""
+    app.state.admin_endpoints = True
+    yield
+    del app.state.admin_endpoints
+
+
+def test_receive_event_without_stage_timing(successful_storage):
+    """Test that no Server-Timing header is sent unless enabled."""
+    response = client.post(
+        "/event", json={"event_type": "message", "event_payload": "test"}
+    )
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+
+def test_receive_event_stage_timing(successful_storage, stage_timing):
+    """Test that stage timing is returned and recorded when enabled."""
+    response = client.post(
+        "/event", json={"event_type": "message", "event_payload": "test"}
+    )
+    assert response.status_code == 200
+
+    stages = [
+        entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")
+    ]
+    assert stages == ["read", "decode", "validate", "store", "total"]
+    assert set(stage_timing.snapshot()) == set(stages)
+
+
+def test_receive_event_stage_timing_on_error(mock_storage, stage_timing):
+    """Test that failed requests still report the stages they reached."""
+    response = client.post("/event", content=b"invalid json")
+    assert response.status_code == 400
+    assert response.headers["server-timing"].startswith("read;dur=")
+    assert "store" not in response.headers["server-timing"]
+
+
+@pytest.mark.parametrize("path", ["/admin/stage-metrics", "/admin/profile"])
+def test_admin_endpoints_disabled(path):
+    """Test that admin endpoints are hidden unless enabled."""
+    response = client.get(path)
+    assert response.status_code == 404
+
+
+def test_admin_stage_metrics(successful_storage, stage_timing, admin_endpoints):
+    """Test that the admin endpoint exposes aggregated stage metrics."""
+    client.post("/event", json={"event_type": "message", "event_payload": "test"})
+    response = local_client.get("/admin/stage-metrics")
+    assert response.status_code == 200
+    assert response.json()["store"]["count"] == 1
+
+
+def test_admin_profile(admin_endpoints):
+    """Test that the profile endpoint returns collapsed stacks."""
+    response = local_client.get("/admin/profile", params={"seconds": 0.05})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack
+        assert int(count) > 0
+
+
+def test_stage_metrics_ignore_unstaged_requests(
+    successful_storage, stage_timing, admin_endpoints
+):
+    """Test that admin calls and unknown routes are not added to the metrics."""
+    client.post("/event", json={"event_type": "message", "event_payload": "test"})
+    before = stage_timing.snapshot()
+
+    response = local_client.get("/admin/profile", params={"seconds": 0.05})
+    assert response.status_code == 200
+    assert local_client.get("/admin/stage-metrics").status_code == 200
+    assert client.get("/missing").status_code == 404
+
+    assert stage_timing.snapshot() == before
+
+
+@pytest.mark.parametrize(
+    "headers,status_code",
+    [
+        # Remote client without a token
+        ({}, 403),
+        # Remote client with a wrong token
+        ({"Authorization": "Bearer wrong"}, 403),
+        # Remote client with the configured token
+        ({"Authorization": "Bearer secret"}, 200),
+    ],
+)
+def test_admin_endpoints_remote_access(headers, status_code, admin_endpoints):
+    """Test that remote clients need the admin token."""
+    app.state.admin_token = "secret"
+    try:
+        response = client.get("/admin/stage-metrics", headers=headers)
+    finally:
+        del app.state.admin_token
+    assert response.status_code == status_code
+
+
+def test_admin_endpoints_remote_without_token(admin_endpoints):
+    """Test that remote clients are refused when no token is configured."""
+    response = client.get(
+        "/admin/profile",
+        params={"seconds": 0.05},
+        headers={"Authorization": "Bearer "},
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"seconds": 0}, {"seconds": 3600}, {"seconds": 1, "interval_ms": 0}],
+)
+def test_admin_profile_invalid_parameters(params, admin_endpoints):
+    """Test that out-of-range profile parameters are rejected."""
+    response = local_client.get("/admin/profile", params=params)
+    assert response.status_code == 400
+
+
+class StaleTypeIdError(psycopg2.IntegrityError):
+    """Foreign key violation as raised for a stale cached type id."""
+
+    pgcode = errorcodes.FOREIGN_KEY_VIOLATION
+
+
+@pytest.fixture
+def pg_storage():
+    """Fixture to provide a storage whose database connection is mocked."""
+    storage = consumer.PostgresEventStorage({})
+    cursor = MagicMock()
+    conn = MagicMock()
+    conn.__enter__.return_value = conn
+    conn.cursor.return_value.__enter__.return_value = cursor
+    with patch.object(storage, "_get_connection", return_value=conn), patch(
+        "cybercare.consumer.psycopg2.extras.execute_values"
+    ) as execute_values:
+        yield storage, cursor, execute_values
+
+
+def test_store_events_resolves_type_ids(pg_storage):
+    """Test that types are looked up, new ones inserted, then served from cache."""
+    storage, cursor, execute_values = pg_storage
+    cursor.fetchall.side_effect = [[("message", 1)], [("user_joined", 2)]]
+
+    assert storage.store_events(
+        [
+            {"event_type": "message", "event_payload": "hello"},
+            {"event_type": "user_joined", "event_payload": "Peter"},
+            {"event_type": "message", "event_payload": "bye"},
+        ]
+    )
+    select, insert = cursor.execute.call_args_list
+    assert select.args[1] == (["message", "user_joined"],)
+    assert "ON CONFLICT (name) DO NOTHING" in repr(insert.args[0])
+    assert insert.args[1] == (["user_joined"],)
+    assert execute_values.call_args.args[2] == [
+        (1, "hello"),
+        (2, "Peter"),
+        (1, "bye"),
+    ]
+
+    # Known types need no lookup round trip
+    cursor.execute.reset_mock()
+    assert storage.store_event({"event_type": "user_joined", "event_payload": "Jack"})
+    cursor.execute.assert_not_called()
+    assert execute_values.call_args.args[2] == [(2, "Jack")]
+
+
+def test_store_events_existing_types_are_not_inserted(pg_storage):
+    """Test that types already in the lookup table do not hit the insert."""
+    storage, cursor, _ = pg_storage
+    cursor.fetchall.return_value = [("message", 1)]
+
+    assert storage.store_event({"event_type": "message", "event_payload": "x"})
+    cursor.execute.assert_called_once()
+
+
+def test_store_events_type_inserted_concurrently(pg_storage):
+    """Test that a type inserted by another writer is looked up again."""
+    storage, cursor, execute_values = pg_storage
+    cursor.fetchall.side_effect = [[], [], [("message", 7)]]
+
+    assert storage.store_event({"event_type": "message", "event_payload": "x"})
+    assert cursor.execute.call_count == 3
+    assert cursor.execute.call_args.args[1] == (["message"],)
+    assert execute_values.call_args.args[2] == [(7, "x")]
+
+
+def test_store_events_failure_does_not_cache(pg_storage):
+    """Test that type ids from a failed transaction are not cached."""
+    storage, cursor, execute_values = pg_storage
+    cursor.fetchall.return_value = [("message", 1)]
+    execute_values.side_effect = psycopg2.DatabaseError("boom")
+
+    assert not storage.store_event({"event_type": "message", "event_payload": "x"})
+
+    execute_values.side_effect = None
+    cursor.execute.reset_mock()
+    assert storage.store_event({"event_type": "message", "event_payload": "x"})
+    cursor.execute.assert_called_once()
+
+
+def test_store_events_retries_stale_type_id(pg_storage):
+    """Test that a stale cached id clears the cache and retries the batch."""
+    storage, cursor, execute_values = pg_storage
+    storage._type_ids["message"] = 1
+    cursor.fetchall.return_value = [("message", 3)]
+    execute_values.side_effect = [
+        StaleTypeIdError("stale"),
+        None,
+    ]
+
+    assert storage.store_event({"event_type": "message", "event_payload": "x"})
+    assert execute_values.call_args.args[2] == [(3, "x")]
+    assert storage._type_ids == {"message": 3}
+
+
+def test_store_events_other_integrity_error_not_retried(pg_storage):
+    """Test that integrity errors other than stale ids are not retried."""
+    storage, cursor, execute_values = pg_storage
+    cursor.fetchall.return_value = [("message", 1)]
+    execute_values.side_effect = psycopg2.IntegrityError("not null")
+
+    assert not storage.store_event({"event_type": "message", "event_payload": "x"})
+    assert execute_values.call_count == 1
+
+
+def test_store_events_retry_fails(pg_storage):
+    """Test that the batch is reported failed if the retry also fails."""
+    storage, cursor, execute_values = pg_storage
+    storage._type_ids["message"] = 1
+    cursor.fetchall.return_value = [("message", 3)]
+    execute_values.side_effect = StaleTypeIdError("stale")
+
+    assert not storage.store_event({"event_type": "message", "event_payload": "x"})
+    assert execute_values.call_count == 2
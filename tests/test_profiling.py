@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from cybercare import profiling
+
+
+def test_stage_timer_records_stages():
+    """Test that stages are timed and formatted as a Server-Timing value."""
+    timer = profiling.StageTimer()
+    with timer.stage("decode"):
+        pass
+    with timer.stage("store"):
+        time.sleep(0.01)
+
+    assert list(timer.stages) == ["decode", "store"]
+    assert timer.stages["store"] >= 0.01
+
+    header = timer.server_timing(0.5)
+    assert header.startswith("decode;dur=")
+    assert ", store;dur=" in header
+    assert header.endswith("total;dur=500.000")
+
+
+def test_null_timer_is_noop():
+    """Test that the disabled timer accepts stages without recording them."""
+    with profiling.NULL_TIMER.stage("decode"):
+        pass
+
+
+def test_stage_metrics_aggregates():
+    """Test that stage metrics accumulate count, total and maximum."""
+    metrics = profiling.StageMetrics()
+    metrics.record({"decode": 0.001, "total": 0.004})
+    metrics.record({"decode": 0.003, "total": 0.006})
+
+    snapshot = metrics.snapshot()
+    assert snapshot["decode"]["count"] == 2
+    assert snapshot["decode"]["total_ms"] == pytest.approx(4.0)
+    assert snapshot["decode"]["avg_ms"] == pytest.approx(2.0)
+    assert snapshot["decode"]["max_ms"] == pytest.approx(3.0)
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_sample_stacks_sees_other_threads():
+    """Test that the sampler captures a busy thread's stack."""
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(100))
+
+    worker = threading.Thread(target=busy_worker, name="busy")
+    worker.start()
+    try:
+        counts = profiling.sample_stacks(0.1, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    busy = {stack: n for stack, n in counts.items() if stack.startswith("busy;")}
+    assert busy
+    assert any("busy_worker (test_profiling.py:" in stack for stack in busy)
+    assert not any("sample_stacks" in stack for stack in counts)
+
+
+def test_collapse_stacks_format():
+    """Test the collapsed-stack output used by flamegraph tools."""
+    output = profiling.collapse_stacks({"main;a;b": 2, "main;a": 5})
+    assert output == "main;a 5\nmain;a;b 2\n"
+    assert profiling.collapse_stacks({}) == ""